@@ -1,88 +1,322 @@
 import win32gui
+import win32ui
 import win32con
 import win32com.client
+import ctypes
+from ctypes import wintypes
+import itertools
 import os
+import queue
+import re
 import time
 import threading
 import tkinter as tk
 from tkinter import messagebox, scrolledtext
-from PIL import Image, ImageGrab
+from PIL import Image, features
 import logging
 
+try:
+    import xxhash
+except ImportError:  # xxhash 为可选依赖，未安装时使用内置哈希
+    xxhash = None
+
 # 配置日志
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# 文件名中不允许出现的字符（保留文字、数字、下划线、空格、点和连字符）
+_SAFE_RE = re.compile(r'[^\w .\-]')
+
+# 截图格式 -> (扩展名, 保存参数)；PNG 使用最低压缩级别以减少编码耗时，WebP 无损格式体积更小
+_SAVE_FORMATS = {
+    'png': ('.png', {'format': 'PNG', 'optimize': False, 'compress_level': 1}),
+    'webp': ('.webp', {'format': 'WEBP', 'lossless': True, 'quality': 0, 'method': 0}),
+}
+
+# 文件名时间戳缓存 [秒, 格式化结果]，同一秒内不重复调用 strftime
+_ts_cache = [0, ""]
+# 文件名序号，保证同一秒内的多张截图不会互相覆盖
+_file_seq = itertools.count(1)
+
+
+def _ts():
+    """返回当前时间的文件名时间戳，每秒只格式化一次"""
+    now = int(time.time())
+    if now != _ts_cache[0]:
+        _ts_cache[:] = [now, time.strftime("%Y%m%d_%H%M%S", time.localtime(now))]
+    return _ts_cache[1]
+
+
+# 使用独立的 DLL 实例，避免修改全局 ctypes.windll 上的 argtypes
+user32 = ctypes.WinDLL('user32', use_last_error=True)
+kernel32 = ctypes.WinDLL('kernel32', use_last_error=True)
+gdi32 = ctypes.WinDLL('gdi32', use_last_error=True)
+
+# WinEvent 相关常量
+EVENT_OBJECT_SHOW = 0x8002
+WINEVENT_OUTOFCONTEXT = 0x0000
+WINEVENT_SKIPOWNPROCESS = 0x0002
+OBJID_WINDOW = 0
+CHILDID_SELF = 0
+PM_NOREMOVE = 0x0000
+WM_NEW_WINDOW = win32con.WM_APP + 1  # 钩子回调通知消息循环有新窗口待处理
+NEW_WINDOW_DEBOUNCE_MS = 150  # 新窗口集中出现时，等待这段时间内没有新窗口后再统一截图
+PW_RENDERFULLCONTENT = 0x00000002  # 让 PrintWindow 包含 DWM 合成的内容
+GA_ROOTOWNER = 3
+HALFTONE = 4  # StretchBlt 缩放模式
+
+WinEventProc = ctypes.WINFUNCTYPE(
+    None,
+    wintypes.HANDLE,  # hWinEventHook
+    wintypes.DWORD,   # event
+    wintypes.HWND,    # hwnd
+    wintypes.LONG,    # idObject
+    wintypes.LONG,    # idChild
+    wintypes.DWORD,   # idEventThread
+    wintypes.DWORD,   # dwmsEventTime
+)
+
+WNDENUMPROC = ctypes.WINFUNCTYPE(wintypes.BOOL, wintypes.HWND, wintypes.LPARAM)
+
+# 热路径上的 Win32 调用通过 ctypes 完成，调用期间会释放 GIL，不阻塞界面线程
+user32.EnumWindows.argtypes = [WNDENUMPROC, wintypes.LPARAM]
+user32.EnumWindows.restype = wintypes.BOOL
+user32.IsWindowVisible.argtypes = [wintypes.HWND]
+user32.IsWindowVisible.restype = wintypes.BOOL
+user32.GetWindowLongW.argtypes = [wintypes.HWND, ctypes.c_int]
+user32.GetWindowLongW.restype = wintypes.LONG
+user32.GetAncestor.argtypes = [wintypes.HWND, wintypes.UINT]
+user32.GetAncestor.restype = wintypes.HWND
+user32.GetWindowRect.argtypes = [wintypes.HWND, ctypes.POINTER(wintypes.RECT)]
+user32.GetWindowRect.restype = wintypes.BOOL
+gdi32.BitBlt.argtypes = [wintypes.HDC, ctypes.c_int, ctypes.c_int, ctypes.c_int, ctypes.c_int,
+                         wintypes.HDC, ctypes.c_int, ctypes.c_int, wintypes.DWORD]
+gdi32.BitBlt.restype = wintypes.BOOL
+gdi32.StretchBlt.argtypes = [wintypes.HDC, ctypes.c_int, ctypes.c_int, ctypes.c_int, ctypes.c_int,
+                             wintypes.HDC, ctypes.c_int, ctypes.c_int, ctypes.c_int, ctypes.c_int, wintypes.DWORD]
+gdi32.StretchBlt.restype = wintypes.BOOL
+gdi32.SetStretchBltMode.argtypes = [wintypes.HDC, ctypes.c_int]
+gdi32.SetStretchBltMode.restype = ctypes.c_int
+gdi32.SetBrushOrgEx.argtypes = [wintypes.HDC, ctypes.c_int, ctypes.c_int, ctypes.POINTER(wintypes.POINT)]
+gdi32.SetBrushOrgEx.restype = wintypes.BOOL
+user32.SetWinEventHook.argtypes = [wintypes.DWORD, wintypes.DWORD, wintypes.HMODULE, WinEventProc,
+                                   wintypes.DWORD, wintypes.DWORD, wintypes.DWORD]
+user32.SetWinEventHook.restype = wintypes.HANDLE
+user32.UnhookWinEvent.argtypes = [wintypes.HANDLE]
+user32.UnhookWinEvent.restype = wintypes.BOOL
+user32.GetMessageW.argtypes = [ctypes.POINTER(wintypes.MSG), wintypes.HWND, wintypes.UINT, wintypes.UINT]
+user32.GetMessageW.restype = wintypes.BOOL
+user32.PeekMessageW.argtypes = [ctypes.POINTER(wintypes.MSG), wintypes.HWND, wintypes.UINT, wintypes.UINT,
+                                wintypes.UINT]
+user32.PeekMessageW.restype = wintypes.BOOL
+user32.TranslateMessage.argtypes = [ctypes.POINTER(wintypes.MSG)]
+user32.TranslateMessage.restype = wintypes.BOOL
+user32.DispatchMessageW.argtypes = [ctypes.POINTER(wintypes.MSG)]
+user32.DispatchMessageW.restype = ctypes.c_ssize_t
+user32.PostThreadMessageW.argtypes = [wintypes.DWORD, wintypes.UINT, wintypes.WPARAM, wintypes.LPARAM]
+user32.PostThreadMessageW.restype = wintypes.BOOL
+user32.PrintWindow.argtypes = [wintypes.HWND, wintypes.HDC, wintypes.UINT]
+user32.PrintWindow.restype = wintypes.BOOL
+user32.SetTimer.argtypes = [wintypes.HWND, ctypes.c_size_t, wintypes.UINT, ctypes.c_void_p]
+user32.SetTimer.restype = ctypes.c_size_t
+user32.KillTimer.argtypes = [wintypes.HWND, ctypes.c_size_t]
+user32.KillTimer.restype = wintypes.BOOL
+kernel32.GetCurrentThreadId.argtypes = []
+kernel32.GetCurrentThreadId.restype = wintypes.DWORD
+
+def content_hash(data):
+    """计算截图像素数据的64位哈希，用于跳过内容相同的截图"""
+    if xxhash is not None:
+        return xxhash.xxh3_64_intdigest(data)
+    return hash(data)
+
+
+def is_candidate_window(hwnd):
+    """判断窗口是否为需要监控的窗口：排除子窗口、工具窗口和从属于其他窗口的对话框"""
+    if user32.GetWindowLongW(hwnd, win32con.GWL_STYLE) & win32con.WS_CHILD:
+        return False
+    if user32.GetWindowLongW(hwnd, win32con.GWL_EXSTYLE) & win32con.WS_EX_TOOLWINDOW:
+        return False
+    return user32.GetAncestor(hwnd, GA_ROOTOWNER) == hwnd
+
+
+def get_window_rect(hwnd):
+    """获取窗口矩形 (left, top, right, bottom)"""
+    rect = wintypes.RECT()
+    if not user32.GetWindowRect(hwnd, ctypes.byref(rect)):
+        raise ctypes.WinError(ctypes.get_last_error())
+    return rect.left, rect.top, rect.right, rect.bottom
+
+
 class WindowMonitor:
-    def __init__(self, save_dir="pic", check_interval=2, log_callback=None):
+    def __init__(self, save_dir="pic", check_interval=2, max_check_interval=30, image_format="png",
+                 thumb_scale=0.5, log_callback=None):
         # 确保保存目录存在
         self.save_dir = save_dir
-        if not os.path.exists(self.save_dir):
-            os.makedirs(self.save_dir)
-            logger.info(f"创建截图保存目录: {self.save_dir}")
-            if log_callback:
-                log_callback(f"创建截图保存目录: {self.save_dir}")
+        os.makedirs(self.save_dir, exist_ok=True)
+        self._save_dir_abs = os.path.abspath(self.save_dir)
+        self._save_dir_sep = self._save_dir_abs + os.sep  # 拼接文件路径用的前缀
         
         self.check_interval = check_interval  # 检查间隔（秒）
-        self.known_windows = set()  # 已记录的窗口句柄集合
+        self.max_check_interval = max_check_interval  # 空闲时检查间隔的上限（秒）
+        if image_format not in _SAVE_FORMATS:
+            raise ValueError(f"不支持的截图格式: {image_format}")
+        if image_format == 'webp' and not features.check('webp'):
+            # 当前 Pillow 未编译 WebP 支持
+            logger.warning("当前环境不支持 WebP，改用 PNG 格式保存截图")
+            image_format = 'png'
+        self.image_format = image_format
+        self._file_ext, self._save_params = _SAVE_FORMATS[image_format]
+        if not 0 < thumb_scale <= 1:
+            raise ValueError(f"截图缩放比例必须在 (0, 1] 范围内: {thumb_scale}")
+        self.thumb_scale = thumb_scale  # 截图保存时的缩放比例（按边长）
+        self._seen_hashes = set()  # 已保存截图的 (宽, 高, 内容哈希)
         self.shell = win32com.client.Dispatch("WScript.Shell")
         self.running = False
+        self._stop_evt = threading.Event()  # 停止监控时置位，用于立即唤醒等待中的线程
         self.log_callback = log_callback
         
+        self._new_windows = queue.Queue()  # 钩子回调发现的新窗口句柄
+        self._thread_id = None  # 运行消息循环的线程ID
+        # (屏幕DC, MFC DC, 内存DC, 缩略图DC)，在监控线程中首次截图时创建，之后一直复用
+        self._capture_dcs = None
+        # 保持回调对象的引用，防止被垃圾回收
+        self._win_event_proc = WinEventProc(self._on_win_event)
+        # 枚举窗口的回调只创建一次，每次枚举复用同一个缓冲区
+        self._enum_buf = []
+        self._enum_proc = WNDENUMPROC(self._enum_windows_callback)
+        
+        # 截图的PNG编码和写盘交给后台线程，监控线程只负责抓取像素
+        self._save_q = queue.Queue(maxsize=25)
+        self._saver = threading.Thread(target=self._saver_loop, daemon=True)
+        self._saver.start()
+        
     def log(self, message):
         """记录日志并可选地调用回调函数"""
         logger.info(message)
         if self.log_callback:
             self.log_callback(message)
             
+    def _on_win_event(self, hook, event, hwnd, id_object, id_child, event_thread, event_time):
+        """窗口事件钩子回调，只关心顶层窗口本身的显示事件"""
+        if not hwnd or id_object != OBJID_WINDOW or id_child != CHILDID_SELF:
+            return
+        # 忽略控件、工具窗口等，再读取标题
+        if not is_candidate_window(hwnd):
+            return
+        # 只处理可见且有标题的窗口
+        if win32gui.IsWindowVisible(hwnd) and win32gui.GetWindowText(hwnd):
+            self._new_windows.put(hwnd)
+            user32.PostThreadMessageW(self._thread_id, WM_NEW_WINDOW, 0, 0)
+    
+    def _enum_windows_callback(self, hwnd, lparam):
+        """EnumWindows 回调，只收集可见且需要监控的窗口"""
+        if user32.IsWindowVisible(hwnd) and is_candidate_window(hwnd):
+            self._enum_buf.append(hwnd)
+        return True
+    
     def get_all_window_handles(self):
-        """获取当前所有窗口的句柄"""
-        window_handles = []
-        
-        def enum_windows_callback(hwnd, ctx):
-            # 只处理可见窗口
-            if win32gui.IsWindowVisible(hwnd) and win32gui.GetWindowText(hwnd):
-                window_handles.append(hwnd)
-        
-        win32gui.EnumWindows(enum_windows_callback, None)
-        return window_handles
+        """获取当前所有需要监控的可见窗口的句柄（不读取标题）"""
+        self._enum_buf.clear()
+        user32.EnumWindows(self._enum_proc, 0)
+        return list(self._enum_buf)
     
     def get_window_info(self, hwnd):
         """获取窗口信息"""
         title = win32gui.GetWindowText(hwnd)
-        rect = win32gui.GetWindowRect(hwnd)
+        rect = get_window_rect(hwnd)
         return {
             'hwnd': hwnd,
             'title': title,
             'rect': rect
         }
     
+    def _get_capture_dcs(self):
+        """获取截图用的设备上下文，GDI句柄归监控线程所有，所有窗口共用"""
+        if self._capture_dcs is None:
+            screen_dc = win32gui.GetDC(0)
+            mfc_dc = win32ui.CreateDCFromHandle(screen_dc)
+            save_dc = mfc_dc.CreateCompatibleDC()
+            thumb_dc = mfc_dc.CreateCompatibleDC()
+            self._capture_dcs = (screen_dc, mfc_dc, save_dc, thumb_dc)
+        return self._capture_dcs
+    
+    def _release_capture_dcs(self):
+        """释放截图用的设备上下文"""
+        if self._capture_dcs is None:
+            return
+        screen_dc, mfc_dc, save_dc, thumb_dc = self._capture_dcs
+        self._capture_dcs = None
+        try:
+            save_dc.DeleteDC()
+            thumb_dc.DeleteDC()
+            win32gui.ReleaseDC(0, screen_dc)
+        except win32ui.error:
+            pass
+    
+    def _render_window(self, hwnd, left, top, width, height, dst_width, dst_height):
+        """将窗口绘制到内存位图，按需缩放后返回 BGRX 像素数据"""
+        screen_dc, mfc_dc, save_dc, thumb_dc = self._get_capture_dcs()
+        bitmap = win32ui.CreateBitmap()
+        bitmap.CreateCompatibleBitmap(mfc_dc, width, height)
+        old_bitmap = save_dc.SelectObject(bitmap)
+        try:
+            # 让窗口直接绘制到内存位图，无需切换前台，被遮挡的窗口也能正确截取
+            if not user32.PrintWindow(hwnd, save_dc.GetSafeHdc(), PW_RENDERFULLCONTENT):
+                # PrintWindow 失败时退回到从屏幕DC复制窗口所在区域
+                gdi32.BitBlt(save_dc.GetSafeHdc(), 0, 0, width, height, screen_dc, left, top, win32con.SRCCOPY)
+            if (dst_width, dst_height) == (width, height):
+                return bitmap.GetBitmapBits(True)
+            
+            # 在GDI中完成缩放，后续复制和编码的像素数随之减少
+            thumb = win32ui.CreateBitmap()
+            thumb.CreateCompatibleBitmap(mfc_dc, dst_width, dst_height)
+            old_thumb = thumb_dc.SelectObject(thumb)
+            try:
+                thumb_hdc = thumb_dc.GetSafeHdc()
+                gdi32.SetStretchBltMode(thumb_hdc, HALFTONE)
+                gdi32.SetBrushOrgEx(thumb_hdc, 0, 0, None)  # HALFTONE 模式要求重置画刷原点
+                gdi32.StretchBlt(thumb_hdc, 0, 0, dst_width, dst_height,
+                                 save_dc.GetSafeHdc(), 0, 0, width, height, win32con.SRCCOPY)
+                return thumb.GetBitmapBits(True)
+            finally:
+                thumb_dc.SelectObject(old_thumb)
+                win32gui.DeleteObject(thumb.GetHandle())
+        finally:
+            save_dc.SelectObject(old_bitmap)
+            win32gui.DeleteObject(bitmap.GetHandle())
+    
     def capture_window(self, hwnd, title):
         """捕获窗口截图并保存"""
         try:
-            # 确保窗口在前台
-            win32gui.SetForegroundWindow(hwnd)
-            time.sleep(0.5)  # 等待窗口切换完成
-            
             # 获取窗口位置和大小
-            rect = win32gui.GetWindowRect(hwnd)
-            left, top, right, bottom = rect
+            left, top, right, bottom = get_window_rect(hwnd)
             width = right - left
             height = bottom - top
+            if width <= 0 or height <= 0:
+                self.log(f"窗口 '{title}' 尺寸无效，跳过截图")
+                return
             
-            # 捕获窗口截图
-            img = ImageGrab.grab(bbox=(left, top, right, bottom))
+            # 截取窗口并缩放到保存尺寸
+            dst_width = max(1, int(width * self.thumb_scale))
+            dst_height = max(1, int(height * self.thumb_scale))
+            bits = self._render_window(hwnd, left, top, width, height, dst_width, dst_height)
             
-            # 生成保存文件名（使用时间戳和窗口标题）
-            timestamp = time.strftime("%Y%m%d_%H%M%S")
+            # 内容与之前保存过的截图完全相同时不再重复保存
+            key = (dst_width, dst_height, content_hash(bits))
+            if key in self._seen_hashes:
+                self.log(f"窗口 '{title}' 的内容与已保存的截图相同，跳过保存")
+                return
+            self._seen_hashes.add(key)
+            
+            # 生成保存文件名（使用时间戳、序号和窗口标题）
+            timestamp = _ts()
             # 清理文件名中的非法字符
-            safe_title = "".join(c for c in title if c.isalnum() or c in (' ', '_', '-', '.'))[:50]
-            filename = f"{timestamp}_{safe_title}.png"
-            filepath = os.path.join(self.save_dir, filename)
+            safe_title = _SAFE_RE.sub('', title)[:50]
+            filepath = f"{self._save_dir_sep}{timestamp}_{next(_file_seq)}_{safe_title}{self._file_ext}"
             
-            # 保存截图
-            img.save(filepath)
-            self.log(f"成功截取窗口 '{title}' 的截图并保存为: {filepath}")
+            # 交给后台线程保存
+            self._enqueue_save((bits, dst_width, dst_height, filepath, title))
             
         except Exception as e:
             error_msg = f"截取窗口 '{title}' 截图时出错: {str(e)}"
@@ -90,45 +324,159 @@ class WindowMonitor:
             if self.log_callback:
                 self.log_callback(error_msg)
     
+    def _enqueue_save(self, item):
+        """将待保存的截图放入队列，队列已满时丢弃最旧的一张，避免阻塞监控线程"""
+        try:
+            self._save_q.put_nowait(item)
+        except queue.Full:
+            try:
+                dropped = self._save_q.get_nowait()
+                self.log(f"保存队列已满，丢弃截图: {dropped[3]}")
+            except queue.Empty:
+                pass
+            self._save_q.put_nowait(item)
+    
+    def _saver_loop(self):
+        """后台保存线程，收到 None 时退出"""
+        while True:
+            item = self._save_q.get()
+            if item is None:
+                return
+            bits, width, height, filepath, title = item
+            try:
+                img = Image.frombuffer('RGB', (width, height), bits, 'raw', 'BGRX', 0, 1)
+                img.save(filepath, **self._save_params)
+                self.log(f"成功截取窗口 '{title}' 的截图并保存为: {filepath}")
+            except Exception as e:
+                error_msg = f"保存窗口 '{title}' 截图时出错: {str(e)}"
+                logger.error(error_msg)
+                if self.log_callback:
+                    self.log_callback(error_msg)
+    
+    def process_new_windows(self):
+        """处理钩子回调收集到的新窗口"""
+        processed = set()  # 同一批次中重复上报的窗口只截图一次
+        while True:
+            try:
+                hwnd = self._new_windows.get_nowait()
+            except queue.Empty:
+                return
+            # 窗口可能在排队期间已被关闭
+            if hwnd in processed or not win32gui.IsWindow(hwnd):
+                continue
+            processed.add(hwnd)
+            window_info = self.get_window_info(hwnd)
+            title = window_info['title']
+            self.log(f"发现新窗口: '{title}' (句柄: {hwnd})")
+            self.capture_window(hwnd, title)
+    
+    def poll_windows(self):
+        """轮询监控新窗口（窗口事件钩子不可用时的备用方案）"""
+        self.log(f"检查间隔: {self.check_interval}秒")
+        
+        # 初始化已知窗口（句柄 -> 标题），已有的窗口不截图
+        self.known_windows = {}
+        for hwnd in self.get_all_window_handles():
+            title = win32gui.GetWindowText(hwnd)
+            if title:
+                self.known_windows[hwnd] = title
+        
+        interval = self.check_interval
+        current_set = set()  # 每次检查复用同一个集合，避免反复创建
+        while self.running:
+            # 获取当前所有窗口
+            current_windows = self.get_all_window_handles()
+            current_set.clear()
+            current_set.update(current_windows)
+            
+            # 原地移除已关闭或隐藏的窗口
+            for hwnd in [hwnd for hwnd in self.known_windows if hwnd not in current_set]:
+                del self.known_windows[hwnd]
+            
+            # 只为新出现的窗口读取标题
+            found = False
+            for hwnd in [hwnd for hwnd in current_windows if hwnd not in self.known_windows]:
+                title = win32gui.GetWindowText(hwnd)
+                if not title:
+                    continue
+                self.known_windows[hwnd] = title
+                found = True
+                self.log(f"发现新窗口: '{title}' (句柄: {hwnd})")
+                self.capture_window(hwnd, title)
+            
+            # 有新窗口时恢复基础间隔，否则逐次加倍，直到上限
+            if found:
+                interval = self.check_interval
+            else:
+                interval = min(interval * 2, self.max_check_interval)
+            
+            # 等待一段时间后再次检查，停止监控时立即返回
+            if self._stop_evt.wait(interval):
+                break
+    
     def monitor_windows(self):
-        """监控新窗口的主循环"""
+        """监控新窗口的主循环（优先使用窗口事件钩子，无需轮询）"""
         self.running = True
+        self._stop_evt.clear()
         self.log("开始监控新窗口...")
-        self.log(f"检查间隔: {self.check_interval}秒")
-        self.log(f"截图保存目录: {os.path.abspath(self.save_dir)}")
+        self.log(f"截图保存目录: {self._save_dir_abs}")
         
-        # 初始化已知窗口列表
-        self.known_windows = set(self.get_all_window_handles())
+        # 先调用一次 PeekMessage 确保本线程已创建消息队列，之后才能接收 WM_QUIT
+        msg = wintypes.MSG()
+        user32.PeekMessageW(ctypes.byref(msg), None, 0, 0, PM_NOREMOVE)
+        self._thread_id = kernel32.GetCurrentThreadId()
         
+        hook = user32.SetWinEventHook(
+            EVENT_OBJECT_SHOW, EVENT_OBJECT_SHOW, None, self._win_event_proc, 0, 0,
+            WINEVENT_OUTOFCONTEXT | WINEVENT_SKIPOWNPROCESS
+        )
+        if not hook:
+            error_msg = f"注册窗口事件钩子失败 (错误码: {ctypes.get_last_error()})，改为轮询方式监控"
+            logger.error(error_msg)
+            if self.log_callback:
+                self.log_callback(error_msg)
+        
+        flush_timer = 0  # 防抖定时器ID，0 表示未启动
         try:
-            while self.running:
-                # 获取当前所有窗口
-                current_windows = set(self.get_all_window_handles())
-                
-                # 找出新出现的窗口
-                new_windows = current_windows - self.known_windows
-                
-                # 处理新窗口
-                for hwnd in new_windows:
-                    window_info = self.get_window_info(hwnd)
-                    title = window_info['title']
-                    self.log(f"发现新窗口: '{title}' (句柄: {hwnd})")
-                    self.capture_window(hwnd, title)
-                
-                # 更新已知窗口列表
-                self.known_windows = current_windows
-                
-                # 等待一段时间后再次检查，同时允许提前终止
-                wait_time = 0
-                while wait_time < self.check_interval and self.running:
-                    time.sleep(0.1)
-                    wait_time += 0.1
+            if not hook:
+                self.poll_windows()
+            
+            # 消息循环：没有事件时线程阻塞在 GetMessage 中，不占用CPU
+            while hook and self.running:
+                ret = user32.GetMessageW(ctypes.byref(msg), None, 0, 0)
+                if ret == 0 or ret == -1:  # WM_QUIT 或出错
+                    break
+                if msg.message == WM_NEW_WINDOW:
+                    # 每来一个新窗口就重新计时，一批窗口全部出现后再统一截图
+                    if flush_timer:
+                        user32.KillTimer(None, flush_timer)
+                    flush_timer = user32.SetTimer(None, 0, NEW_WINDOW_DEBOUNCE_MS, None)
+                    if not flush_timer:
+                        self.process_new_windows()
+                    continue
+                if msg.message == win32con.WM_TIMER and flush_timer and msg.wParam == flush_timer:
+                    user32.KillTimer(None, flush_timer)
+                    flush_timer = 0
+                    self.process_new_windows()
+                    continue
+                user32.TranslateMessage(ctypes.byref(msg))
+                user32.DispatchMessageW(ctypes.byref(msg))
                 
         except Exception as e:
             error_msg = f"监控过程中出错: {str(e)}"
             logger.error(error_msg)
             if self.log_callback:
                 self.log_callback(error_msg)
+        finally:
+            if flush_timer:
+                user32.KillTimer(None, flush_timer)
+            if hook:
+                user32.UnhookWinEvent(hook)
+            self._thread_id = None
+            # GDI句柄属于本线程，在这里统一释放
+            self._release_capture_dcs()
+            # 通知后台线程写完剩余截图后退出
+            self._save_q.put(None)
         
         if self.running:
             self.running = False
@@ -136,9 +484,15 @@ class WindowMonitor:
     def stop_monitoring(self):
         """停止监控"""
         self.running = False
+        self._stop_evt.set()
+        # 唤醒阻塞在 GetMessage 中的监控线程
+        if self._thread_id:
+            user32.PostThreadMessageW(self._thread_id, win32con.WM_QUIT, 0, 0)
         self.log("停止监控新窗口")
 
 class WindowMonitorApp:
+    MAX_LOG_LINES = 2000  # 日志区域最多保留的行数
+    
     def __init__(self, root):
         self.root = root
         self.root.title("窗口监控工具")
@@ -152,8 +506,14 @@ class WindowMonitorApp:
         self.monitor = None
         self.monitor_thread = None
         
+        # 日志消息队列，后台线程只入队，由界面线程批量写入日志区域
+        self._log_q = queue.Queue()
+        self._log_event_pending = False  # 是否已有未处理的 <<LogAvailable>> 事件
+        
         # 创建界面元素
         self.create_widgets()
+        # 有新日志时才唤醒界面线程，空闲时不做任何定时刷新
+        self.root.bind('<<LogAvailable>>', self._drain_log)
         
         # 窗口关闭时的处理
         self.root.protocol("WM_DELETE_WINDOW", self.on_closing)
@@ -250,12 +610,37 @@ class WindowMonitorApp:
         status_bar.pack(side=tk.BOTTOM, fill=tk.X)
     
     def append_log(self, message):
-        """向日志区域添加消息"""
-        self.log_text.config(state=tk.NORMAL)
+        """添加日志消息（可在任意线程调用）"""
         timestamp = time.strftime("%Y-%m-%d %H:%M:%S")
-        self.log_text.insert(tk.END, f"[{timestamp}] {message}\n")
-        self.log_text.see(tk.END)  # 自动滚动到最后一行
-        self.log_text.config(state=tk.DISABLED)
+        self._log_q.put(f"[{timestamp}] {message}")
+        # 多条日志合并为一次事件，由界面线程统一处理
+        if not self._log_event_pending:
+            self._log_event_pending = True
+            try:
+                self.root.event_generate('<<LogAvailable>>', when='tail')
+            except (tk.TclError, RuntimeError):
+                # 主窗口已关闭
+                pass
+    
+    def _drain_log(self, event=None):
+        """在界面线程中将队列中的日志一次性写入日志区域"""
+        self._log_event_pending = False
+        messages = []
+        try:
+            while True:
+                messages.append(self._log_q.get_nowait())
+        except queue.Empty:
+            pass
+        
+        if messages:
+            self.log_text.config(state=tk.NORMAL)
+            self.log_text.insert(tk.END, "\n".join(messages) + "\n")
+            # 超出上限时一次性删除最早的日志，避免长时间运行后越来越慢
+            lines = int(self.log_text.index('end-1c').split('.')[0])
+            if lines > self.MAX_LOG_LINES:
+                self.log_text.delete('1.0', f'{lines - self.MAX_LOG_LINES}.0')
+            self.log_text.see(tk.END)  # 自动滚动到最后一行
+            self.log_text.config(state=tk.DISABLED)
     
     def start_monitoring(self):
         """开始监控新窗口"""